@@ -14,7 +14,6 @@ from inventory_models import (
 from inventory_simulator import InventorySimulator
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create router
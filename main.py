@@ -3,11 +3,15 @@ Main FastAPI application for logistics routing system
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import logging
 import uvicorn
 
 from routing_routes import router as routing_router
 from inventory_routes import router as inventory_router
 
+# Configure logging once for the whole application
+logging.basicConfig(level=logging.INFO)
+
 # Create FastAPI app
 app = FastAPI(
     title="Logistics Management API",
@@ -3,7 +3,7 @@ Pydantic models for the Routing API based on routing.api.schema.json
 """
 from datetime import datetime
 from typing import List, Optional, Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from enum import Enum
 
 
@@ -53,7 +53,7 @@ class PlanRunRequest(BaseModel):
     depots: List[Depot] = Field(..., min_length=1)
     trucks: List[TruckSpec] = Field(..., min_length=1)
     stops: List[OrderStop] = Field(..., min_length=1)
-    params: Optional[RoutingParams] = Field(default_factory=RoutingParams)
+    params: Optional[RoutingParams] = Field(default=None)
     traffic_profile_id: Optional[str] = Field(None, description="Use current or forecasted profile id")
 
 
@@ -76,15 +76,14 @@ class ReRouteRequest(BaseModel):
     truck_id: Optional[str] = Field(None, description="required when scope=truck")
     change_limit: float = Field(..., ge=0, le=0.6)
     lock_hops: int = Field(..., ge=1, le=3)
-    params: Optional[RoutingParams] = Field(default_factory=RoutingParams)
+    params: Optional[RoutingParams] = Field(default=None)
     reason: Optional[ReRouteReason] = None
 
-    @classmethod
-    def model_validate(cls, v):
-        if isinstance(v, dict):
-            if v.get('scope') == 'truck' and not v.get('truck_id'):
-                raise ValueError('truck_id is required when scope=truck')
-        return super().model_validate(v)
+    @model_validator(mode='after')
+    def _check_truck(self):
+        if self.scope == ReRouteScope.TRUCK and not self.truck_id:
+            raise ValueError('truck_id is required when scope=truck')
+        return self
 
 
 # Output models
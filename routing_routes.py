@@ -1,15 +1,25 @@
 """
 FastAPI router for routing endpoints
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 from routing_models import PlanRunRequest, ReRouteRequest, PlanRunResponse, ReRouteResponse
 from routing_simulator import RoutingSimulator
 import logging
 
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+    _msgpack_encoder = msgspec.msgpack.Encoder()
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+__all__ = ["router"]
+
 # Create router
 router = APIRouter(prefix="/routing", tags=["routing"])
 
@@ -17,21 +27,51 @@ router = APIRouter(prefix="/routing", tags=["routing"])
 simulator = RoutingSimulator()
 
 
-@router.post("/plan/run", response_model=PlanRunResponse)
-async def plan_routes(request: PlanRunRequest) -> PlanRunResponse:
+def _prefers_msgpack(accept: str) -> bool:
+    """True when the Accept header ranks msgpack above zero and no lower than JSON"""
+    msgpack_q = json_q = 0.0
+    for part in accept.split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type == MSGPACK_MEDIA_TYPE:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in ("application/json", "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+@router.post(
+    "/plan/run",
+    response_model=PlanRunResponse,
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+)
+async def plan_routes(
+    request: PlanRunRequest,
+    http_request: Request
+) -> PlanRunResponse:
     """
     Execute route planning for a given date with trucks, depots, and stops.
     
     Features:
     - Assigns stops to nearest depots
-    - Optimizes routes using nearest neighbor algorithm
+    - Orders each depot cluster with a Christofides tour (nearest neighbor for large clusters)
     - Populates RouteStop.h3 using H3 resolution from RoutingParams.overlap_h3_res (default 8)
     - Calculates utilization_pct as volume-based: sum(load_cuft)/capacity_cuft
     - Generates loading_order in reverse delivery sequence (LIFO)
     - Detects spatial-temporal overlaps between trucks
+    - Returns application/x-msgpack instead of JSON when requested via Accept (requires msgspec)
     """
     try:
-        logger.info(f"Planning routes for {request.for_date} with {len(request.trucks)} trucks and {len(request.stops)} stops")
+        logger.info("Planning routes for %s with %d trucks and %d stops",
+                    request.for_date, len(request.trucks), len(request.stops))
         
         # Validate request
         if not request.trucks:
@@ -43,21 +83,31 @@ async def plan_routes(request: PlanRunRequest) -> PlanRunResponse:
         
         # Validate truck-depot relationships
         depot_ids = {depot.id for depot in request.depots}
-        for truck in request.trucks:
-            if truck.depot_id not in depot_ids:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Truck {truck.id} references non-existent depot {truck.depot_id}"
-                )
+        truck_depot_ids = {truck.depot_id for truck in request.trucks}
+        missing_depots = truck_depot_ids - depot_ids
+        if missing_depots:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Trucks reference non-existent depots: {sorted(missing_depots)}"
+            )
         
         # Execute route planning
         response = simulator.plan_routes(request)
         
-        logger.info(f"Generated plan {response.plan_id} with {len(response.routes)} routes in {response.runtime_s:.2f}s")
-        logger.info(f"KPIs: on_time={response.kpi.on_time_pct:.1%}, overlap={response.kpi.overlap_pct:.1%}, miles_per_order={response.kpi.miles_per_order:.1f}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Generated plan {response.plan_id} with {len(response.routes)} routes in {response.runtime_s:.2f}s")
+            logger.info(f"KPIs: on_time={response.kpi.on_time_pct:.1%}, overlap={response.kpi.overlap_pct:.1%}, miles_per_order={response.kpi.miles_per_order:.1f}")
         
-        return response
+        if MSGSPEC_AVAILABLE and _prefers_msgpack(http_request.headers.get("accept", "")):
+            return Response(
+                content=_msgpack_encoder.encode(response.model_dump(mode="python")),
+                media_type=MSGPACK_MEDIA_TYPE
+            )
         
+        return response
+
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Validation error in route planning: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -79,17 +129,15 @@ async def reroute_plan(request: ReRouteRequest) -> ReRouteResponse:
     - Tracks reason for re-routing (incident, eta_risk, stock, manual, other)
     """
     try:
-        logger.info(f"Re-routing plan {request.plan_id} with scope={request.scope}, change_limit={request.change_limit}")
-        
-        # Validate scope-specific requirements
-        if request.scope == "truck" and not request.truck_id:
-            raise HTTPException(status_code=400, detail="truck_id is required when scope=truck")
+        logger.info("Re-routing plan %s with scope=%s, change_limit=%s",
+                    request.plan_id, request.scope.value, request.change_limit)
         
         # Execute re-routing
         response = simulator.reroute(request)
         
-        logger.info(f"Re-routed plan {response.plan_id}: {response.changed_stops_pct:.1%} stops changed in {response.runtime_s:.2f}s")
-        logger.info(f"Updated KPIs: on_time={response.kpi.on_time_pct:.1%}, overlap={response.kpi.overlap_pct:.1%}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Re-routed plan {response.plan_id}: {response.changed_stops_pct:.1%} stops changed in {response.runtime_s:.2f}s")
+            logger.info(f"Updated KPIs: on_time={response.kpi.on_time_pct:.1%}, overlap={response.kpi.overlap_pct:.1%}")
         
         return response
         
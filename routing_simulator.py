@@ -4,23 +4,151 @@ Routing simulator for vehicle routing optimization with H3 integration
 import random
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Set
-from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple, Set
+from dataclasses import dataclass, field
 import math
+import importlib.util
+from collections import OrderedDict
+
+import numpy as np
 
 from routing_models import (
     PlanRunRequest, ReRouteRequest, PlanRunResponse, ReRouteResponse,
     RouteSummary, RouteStop, StopType, Location, OverlapIncident,
-    PlanKPI, PickPackOutput, PickTask
+    PlanKPI, PickPackOutput, PickTask, RoutingParams
 )
 
 try:
     import h3
     H3_AVAILABLE = True
+    # Resolve the cell lookup once: h3 v4 renamed geo_to_h3 to latlng_to_cell
+    _h3_latlng_to_cell = getattr(h3, "latlng_to_cell", None) or getattr(h3, "geo_to_h3", None)
 except ImportError:
     H3_AVAILABLE = False
+    _h3_latlng_to_cell = None
     print("Warning: h3 library not available. H3 cells will use mock values.")
 
+# networkx is slow to import and only needed for small clusters,
+# so only probe for it here and import on first use
+NETWORKX_AVAILABLE = importlib.util.find_spec("networkx") is not None
+
+# Shared defaults for requests that omit params (treated as read-only)
+_DEFAULT_PARAMS = RoutingParams()
+
+EARTH_RADIUS_KM = 6371
+ROAD_FACTOR = 1.3
+
+# Most recent plans kept for re-routing; older plans are evicted
+PLAN_CACHE_SIZE = 64
+
+# Depot clusters smaller than this are ordered with a Christofides tour instead of nearest neighbour
+CHRISTOFIDES_MAX_STOPS = 32
+
+_MICROSECOND = timedelta(microseconds=1)
+_US_PER_MINUTE = 60_000_000
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Driving distance in km between two points in degrees (Haversine + road factor)"""
+    lat1, lon1 = math.radians(lat1), math.radians(lon1)
+    lat2, lon2 = math.radians(lat2), math.radians(lon2)
+    
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * ROAD_FACTOR * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _haversine_precomp(cos_lat1, lat1, lon1, cos_lats2, lats2: np.ndarray, lons2: np.ndarray) -> np.ndarray:
+    """Haversine driving distances with the latitude cosines supplied by the caller (radians in, km out)"""
+    dlat = lats2 - lat1
+    dlon = lons2 - lon1
+    a = np.sin(dlat / 2) ** 2 + cos_lat1 * cos_lats2 * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * ROAD_FACTOR * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _haversine_vector(lat1, lon1, lats2: np.ndarray, lons2: np.ndarray) -> np.ndarray:
+    """Driving distances in km between points in radians (broadcasts, e.g. one-to-many or N x D)"""
+    return _haversine_precomp(np.cos(lat1), lat1, lon1, np.cos(lats2), lats2, lons2)
+
+
+def _christofides_tour(depot_row: np.ndarray, dist: np.ndarray) -> List[int]:
+    """Christofides tour over a depot and its stops, as stop positions in visiting order from the depot"""
+    import networkx as nx
+    
+    n = len(depot_row)
+    weights = np.zeros((n + 1, n + 1))
+    weights[0, 1:] = weights[1:, 0] = depot_row
+    weights[1:, 1:] = dist
+    
+    # Set weights edge by edge: from_numpy_array would drop zero-length edges between co-located stops
+    graph = nx.complete_graph(n + 1)
+    for u, v in graph.edges:
+        graph[u][v]["weight"] = weights[u, v]
+    
+    cycle = nx.approximation.christofides(graph, weight="weight")[:-1]
+    start = cycle.index(0)
+    return [node - 1 for node in cycle[start + 1:] + cycle[:start]]
+
+
+@dataclass
+class DepotCluster:
+    """Stops assigned to one depot; trucks based there take stops from it until it is exhausted"""
+    stop_idx: np.ndarray     # indices into request.stops
+    lats: np.ndarray         # radians
+    lons: np.ndarray         # radians
+    depot_row: np.ndarray    # depot-to-stop distances (km)
+    remaining: np.ndarray = field(init=False)
+    remaining_count: int = field(init=False)
+    cos_lats: np.ndarray = field(init=False)
+    dist: Optional[np.ndarray] = field(init=False, default=None)  # stop-to-stop matrix (tour only)
+    tour: Optional[List[int]] = field(init=False, default=None)
+    tour_next: int = field(init=False, default=0)
+    
+    def __post_init__(self):
+        n = len(self.stop_idx)
+        self.remaining = np.ones(n, dtype=bool)
+        self.remaining_count = n
+        self.cos_lats = np.cos(self.lats)
+        
+        if NETWORKX_AVAILABLE and 2 < n < CHRISTOFIDES_MAX_STOPS:
+            # Small clusters: one Christofides tour, consumed in order by the depot's trucks
+            self.dist = _haversine_precomp(
+                self.cos_lats[:, None], self.lats[:, None], self.lons[:, None],
+                self.cos_lats[None, :], self.lats[None, :], self.lons[None, :]
+            )
+            self.tour = _christofides_tour(self.depot_row, self.dist)
+    
+    def next_stop(self, current_pos: int) -> Tuple[int, float]:
+        """Next stop to visit from current_pos (-1 = depot), as (position, distance km)"""
+        if self.tour is not None:
+            pos = self.tour[self.tour_next]
+            row = self.depot_row if current_pos < 0 else self.dist[current_pos]
+            return pos, float(row[pos])
+        
+        if current_pos < 0:
+            # Depot legs rank on the exact distances already computed for assignment
+            distances = np.where(self.remaining, self.depot_row, np.inf)
+            pos = int(distances.argmin())
+            return pos, float(distances[pos])
+        
+        # Rank by squared equirectangular distance (exact ordering at city scale)
+        lat, lon, cos_lat = self.lats[current_pos], self.lons[current_pos], self.cos_lats[current_pos]
+        row = (self.lats - lat) ** 2 + (cos_lat * (self.lons - lon)) ** 2
+        # Visited stops are masked to inf so argmin runs over the whole cluster
+        pos = int(np.where(self.remaining, row, np.inf).argmin())
+        
+        # True Haversine only for the chosen leg
+        distance = _haversine_precomp(cos_lat, lat, lon, self.cos_lats[pos], self.lats[pos], self.lons[pos])
+        return pos, float(distance)
+    
+    def take(self, pos: int) -> None:
+        """Mark a stop as routed"""
+        self.remaining[pos] = False
+        self.remaining_count -= 1
+        self.tour_next += 1
+
 
 @dataclass
 class OptimizationResult:
@@ -29,6 +157,7 @@ class OptimizationResult:
     overlap_incidents: List[OverlapIncident]
     kpi: PlanKPI
     runtime_s: float
+    delivery_stops: List[List[RouteStop]]  # per route, parallel to routes
 
 
 class RoutingSimulator:
@@ -47,118 +176,155 @@ class RoutingSimulator:
         # Sample warehouse data for pick/pack simulation
         self.warehouse_aisles = ["A", "B", "C", "D", "E", "F"]
         self.items_per_aisle = 50
+        self._rng = np.random.default_rng()
         
-        # Routing optimization cache
-        self._plan_cache: Dict[str, OptimizationResult] = {}
+        # Routing optimization cache (LRU, bounded by PLAN_CACHE_SIZE)
+        self._plan_cache: "OrderedDict[str, OptimizationResult]" = OrderedDict()
     
     def calculate_distance_km(self, loc1: Location, loc2: Location) -> float:
         """Calculate driving distance between two locations (Haversine approximation + road factor)"""
-        # Haversine formula
-        R = 6371  # Earth radius in km
-        lat1, lon1 = math.radians(loc1.lat), math.radians(loc1.lon)
-        lat2, lon2 = math.radians(loc2.lat), math.radians(loc2.lon)
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        straight_distance = R * c
-        # Apply road factor for urban driving
-        return straight_distance * 1.3
+        return _haversine_km(loc1.lat, loc1.lon, loc2.lat, loc2.lon)
     
     def populate_h3_cells(self, stops: List[RouteStop], h3_resolution: int) -> List[RouteStop]:
         """Populate H3 cells for route stops"""
-        for stop in stops:
-            if H3_AVAILABLE:
-                try:
-                    # Try new API first
-                    stop.h3 = h3.latlng_to_cell(stop.location.lat, stop.location.lon, h3_resolution)
-                except AttributeError:
-                    # Fall back to old API
-                    try:
-                        stop.h3 = h3.geo_to_h3(stop.location.lat, stop.location.lon, h3_resolution)
-                    except AttributeError:
-                        # Use mock if both fail
-                        lat_int = int(stop.location.lat * 1000)
-                        lon_int = int(stop.location.lon * 1000)
-                        stop.h3 = f"8{abs(lat_int % 10000):04d}{abs(lon_int % 10000):04d}"
-            else:
-                # Mock H3 cell for testing without h3 library
-                lat_int = int(stop.location.lat * 1000)
-                lon_int = int(stop.location.lon * 1000)
-                stop.h3 = f"8{abs(lat_int % 10000):04d}{abs(lon_int % 10000):04d}"
+        lats = [stop.location.lat for stop in stops]
+        lons = [stop.location.lon for stop in stops]
+        
+        if _h3_latlng_to_cell is not None:
+            cells = [_h3_latlng_to_cell(lat, lon, h3_resolution) for lat, lon in zip(lats, lons)]
+        else:
+            # Mock H3 cell for testing without h3 library
+            cells = [
+                f"8{abs(int(lat * 1000) % 10000):04d}{abs(int(lon * 1000) % 10000):04d}"
+                for lat, lon in zip(lats, lons)
+            ]
+        
+        for stop, cell in zip(stops, cells):
+            stop.h3 = cell
         return stops
     
     def detect_overlaps(self, routes: List[RouteSummary], window_minutes: int = 30) -> List[OverlapIncident]:
-        """Detect spatial-temporal overlaps between trucks"""
+        """
+        Detect spatial-temporal overlaps between trucks.
+        
+        Within an H3 cell, an incident lasts while two or more visits are active at once (eta until
+        service end + window_minutes) and closes as soon as fewer than two are. Visits are not chained
+        through a running overlap end: T1 and T3 overlapping, then T3 and T0 overlapping after T1 has
+        left, gives two incidents ({T1, T3} and {T3, T0}) rather than one {T1, T3, T0}.
+        """
         overlaps = []
         
-        # Group stops by H3 cell
-        h3_timeline: Dict[str, List[Tuple[str, datetime, datetime]]] = {}
+        visit_count = sum(
+            1 for route in routes for stop in route.stops
+            if stop.h3 and stop.type != StopType.DEPOT
+        )
+        if visit_count < 2:
+            return overlaps
+        
+        # Flatten visits into parallel arrays: H3 cell (as its 64-bit index), route index,
+        # start/end as integer microseconds from the first visit
+        cells = np.empty(visit_count, dtype=object)
+        cell_ints = np.empty(visit_count, dtype=np.int64)
+        route_codes = np.empty(visit_count, dtype=np.int64)
+        starts = np.empty(visit_count, dtype=np.int64)
+        ends = np.empty(visit_count, dtype=np.int64)
         
-        for route in routes:
+        base_ts = None
+        i = 0
+        for code, route in enumerate(routes):
             for stop in route.stops:
                 if stop.h3 and stop.type != StopType.DEPOT:
-                    service_end = stop.eta + timedelta(minutes=stop.service_min)
-                    
-                    if stop.h3 not in h3_timeline:
-                        h3_timeline[stop.h3] = []
-                    h3_timeline[stop.h3].append((route.truck_id, stop.eta, service_end))
-        
-        # Find overlapping time windows in same H3 cells
-        for h3_cell, timeline in h3_timeline.items():
-            timeline.sort(key=lambda x: x[1])  # Sort by start time
+                    if base_ts is None:
+                        base_ts = stop.eta
+                    start_us = (stop.eta - base_ts) // _MICROSECOND
+                    cells[i] = stop.h3
+                    cell_ints[i] = int(stop.h3, 16)  # H3 strings (and mock cells) are hex
+                    route_codes[i] = code
+                    starts[i] = start_us
+                    ends[i] = start_us + round(stop.service_min * _US_PER_MINUTE)
+                    i += 1
+        
+        # Group visits by integer cell, ordered by start time within each cell
+        order = np.lexsort((starts, cell_ints))
+        cell_ints, cells, route_codes = cell_ints[order], cells[order], route_codes[order]
+        starts, ends = starts[order], ends[order]
+        bounds = np.flatnonzero(np.diff(cell_ints)) + 1
+        bounds = np.concatenate(([0], bounds, [visit_count]))
+        window_us = window_minutes * _US_PER_MINUTE
+        
+        # Sweep each cell's visits: a visit stays active from its eta until service end + window,
+        # and an incident is open while two or more visits are active at once
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            n = hi - lo
+            if n < 2:
+                continue
             
-            for i in range(len(timeline)):
-                overlapping_trucks = [timeline[i][0]]
-                overlap_start = timeline[i][1]
-                overlap_end = timeline[i][2]
-                
-                for j in range(i + 1, len(timeline)):
-                    # Check if trucks overlap within the window
-                    if timeline[j][1] <= overlap_end + timedelta(minutes=window_minutes):
-                        overlapping_trucks.append(timeline[j][0])
-                        overlap_end = max(overlap_end, timeline[j][2])
-                    else:
-                        break
-                
-                if len(overlapping_trucks) >= 2:
-                    overlaps.append(OverlapIncident(
-                        h3=h3_cell,
-                        start_ts=overlap_start,
-                        end_ts=overlap_end,
-                        truck_ids=overlapping_trucks
-                    ))
+            cell_starts, cell_ends = starts[lo:hi], ends[lo:hi]
+            times = np.concatenate((cell_starts, cell_ends + window_us))
+            events = np.arange(2 * n)  # e < n: arrival of visit e, e >= n: departure of visit e - n
+            events = events[np.lexsort((events % n, events >= n, times))]
+            
+            starts_l, ends_l = cell_starts.tolist(), cell_ends.tolist()
+            routes_l = route_codes[lo:hi].tolist()
+            active: Dict[int, None] = {}
+            overlapping_routes: List[int] = []
+            overlap_start = overlap_end = 0
+            
+            for e in events.tolist():
+                if e < n:
+                    active[e] = None
+                    if len(active) == 2:
+                        overlapping_routes = [routes_l[v] for v in active]
+                        overlap_start = min(starts_l[v] for v in active)
+                        overlap_end = max(ends_l[v] for v in active)
+                    elif len(active) > 2:
+                        overlapping_routes.append(routes_l[e])
+                        overlap_end = max(overlap_end, ends_l[e])
+                else:
+                    del active[e - n]
+                    if len(active) == 1:
+                        truck_ids = list(dict.fromkeys(routes[r].truck_id for r in overlapping_routes))
+                        if len(truck_ids) >= 2:
+                            overlaps.append(OverlapIncident(
+                                h3=cells[lo],
+                                start_ts=base_ts + timedelta(microseconds=overlap_start),
+                                end_ts=base_ts + timedelta(microseconds=overlap_end),
+                                truck_ids=truck_ids
+                            ))
         
         return overlaps
     
-    def calculate_utilization(self, route: RouteSummary, truck_capacity: float) -> float:
+    def calculate_utilization(self, stops: List[RouteStop], truck_capacity: float) -> float:
         """Calculate volume-based utilization: sum(load_cuft)/capacity_cuft"""
-        total_load = sum(stop.load_cuft for stop in route.stops if stop.type == StopType.DELIVERY)
+        total_load = sum(stop.load_cuft for stop in stops if stop.type == StopType.DELIVERY)
         return min(total_load / truck_capacity, 1.0) if truck_capacity > 0 else 0.0
     
-    def generate_pick_sequence(self, route: RouteSummary) -> PickPackOutput:
+    def generate_pick_sequence(self, route: RouteSummary,
+                               delivery_stops: Optional[List[RouteStop]] = None) -> PickPackOutput:
         """Generate pick sequence and loading order for a route"""
         pick_tasks = []
-        delivery_stops = [stop for stop in route.stops if stop.type == StopType.DELIVERY]
+        if delivery_stops is None:
+            delivery_stops = [stop for stop in route.stops if stop.type == StopType.DELIVERY]
+        
+        # Simulate items per stop: roughly 5 cuft per item
+        items_per_stop = [max(1, int(stop.load_cuft / 5)) for stop in delivery_stops]
+        total_items = sum(items_per_stop)
+        
+        # Draw aisles, bins and quantities for every pick task in one batch
+        aisles = self._rng.choice(self.warehouse_aisles, total_items).tolist()
+        bins = self._rng.integers(1, self.items_per_aisle + 1, total_items).tolist()
+        qtys = self._rng.uniform(1, 3, total_items).tolist()
         
         # Generate pick tasks based on stops
         seq = 1
-        for stop in delivery_stops:
-            # Simulate items for this stop
-            num_items = max(1, int(stop.load_cuft / 5))  # Roughly 5 cuft per item
+        for stop, num_items in zip(delivery_stops, items_per_stop):
             for item_idx in range(num_items):
-                aisle = random.choice(self.warehouse_aisles)
-                bin_num = random.randint(1, self.items_per_aisle)
-                
                 pick_tasks.append(PickTask(
                     seq=seq,
-                    aisle=aisle,
-                    bin=f"{bin_num:02d}",
+                    aisle=aisles[seq - 1],
+                    bin=f"{bins[seq - 1]:02d}",
                     item_id=f"ITEM_{stop.stop_id}_{item_idx+1}",
-                    qty=random.uniform(1, 3)
+                    qty=qtys[seq - 1]
                 ))
                 seq += 1
         
@@ -174,59 +340,85 @@ class RoutingSimulator:
     def optimize_routes(self, request: PlanRunRequest) -> OptimizationResult:
         """Main routing optimization engine"""
         start_time = datetime.now()
+        params = request.params or _DEFAULT_PARAMS
         
         # Basic nearest neighbor routing with some optimizations
         routes = []
+        route_deliveries = []
+        
+        # Stop coordinates in radians, computed once for vectorized distance queries
+        stop_lats = np.radians(np.array([s.location.lat for s in request.stops], dtype=np.float64))
+        stop_lons = np.radians(np.array([s.location.lon for s in request.stops], dtype=np.float64))
+        
+        # Stop-to-depot distances (N x D), shared by assignment and depot legs
+        depot_lats = np.radians(np.array([d.location.lat for d in request.depots], dtype=np.float64))
+        depot_lons = np.radians(np.array([d.location.lon for d in request.depots], dtype=np.float64))
+        depot_dist = _haversine_vector(stop_lats[:, None], stop_lons[:, None], depot_lats[None, :], depot_lons[None, :])
+        depot_col = {depot.id: col for col, depot in enumerate(request.depots)}
+        depot_by_id = {depot.id: depot for depot in request.depots}
         
         # Group stops by depot proximity for initial assignment
-        depot_assignments = self._assign_stops_to_depots(request.stops, request.depots)
+        depot_assignments = self._assign_stops_to_depots(depot_dist, request.depots)
+        clusters: Dict[str, DepotCluster] = {}
+        window_start = datetime.fromisoformat(f"{request.for_date}T{params.delivery_window_start}:00")
         
         for truck in request.trucks:
-            truck_depot = next(d for d in request.depots if d.id == truck.depot_id)
-            assigned_stops = depot_assignments.get(truck.depot_id, [])
+            truck_depot = depot_by_id[truck.depot_id]
+            
+            cluster = clusters.get(truck.depot_id)
+            if cluster is None:
+                col = depot_col[truck.depot_id]
+                assigned_idx = np.array(depot_assignments.get(truck.depot_id, []), dtype=np.intp)
+                cluster = DepotCluster(
+                    stop_idx=assigned_idx,
+                    lats=stop_lats[assigned_idx],
+                    lons=stop_lons[assigned_idx],
+                    depot_row=depot_dist[assigned_idx, col]
+                )
+                clusters[truck.depot_id] = cluster
             
-            if not assigned_stops:
+            # Trucks sharing a depot split its cluster; later trucks get what is left
+            if not cluster.remaining_count:
                 continue
             
             # Create route for this truck
             route_stops = []
-            current_location = truck_depot.location
-            remaining_stops = assigned_stops.copy()
+            current_pos = -1
+            
             current_load = 0.0
-            current_time = datetime.fromisoformat(f"{request.for_date}T{request.params.delivery_window_start}:00")
+            current_min = 0.0  # minutes since window start; datetimes are built only for RouteStops
             
             # Add depot start
             route_stops.append(RouteStop(
                 stop_id=f"depot_start_{truck.id}",
                 type=StopType.DEPOT,
                 location=truck_depot.location,
-                eta=current_time,
-                service_min=0,
-                load_cuft=0
+                eta=window_start,
+                service_min=0.0,
+                load_cuft=0.0
             ))
             
             total_distance = 0.0
             total_drive_time = 0.0
             
-            # Nearest neighbor routing
-            while remaining_stops and current_load < truck.capacity_cuft:
-                # Find nearest unvisited stop
-                nearest_stop = min(remaining_stops, 
-                                 key=lambda s: self.calculate_distance_km(current_location, s.location))
+            # Follow the cluster tour (or nearest neighbour) until the truck is full
+            while cluster.remaining_count and current_load < truck.capacity_cuft:
+                nearest_pos, distance = cluster.next_stop(current_pos)
+                nearest_stop = request.stops[cluster.stop_idx[nearest_pos]]
                 
                 # Check capacity constraint
                 if current_load + nearest_stop.items_volume_cuft > truck.capacity_cuft:
                     break
                 
-                remaining_stops.remove(nearest_stop)
+                cluster.take(nearest_pos)
+                current_pos = nearest_pos
                 
-                # Calculate travel time and distance
-                distance = self.calculate_distance_km(current_location, nearest_stop.location)
+                # Calculate travel time
                 drive_time = distance * random.uniform(1.2, 2.0)  # Variable speed
                 
                 total_distance += distance
                 total_drive_time += drive_time
-                current_time += timedelta(minutes=drive_time)
+                current_min += drive_time
                 current_load += nearest_stop.items_volume_cuft
                 
                 # Add route stop
@@ -234,42 +426,40 @@ class RoutingSimulator:
                     stop_id=nearest_stop.order_id,
                     type=StopType.DELIVERY,
                     location=nearest_stop.location,
-                    eta=current_time,
+                    eta=window_start + timedelta(minutes=current_min),
                     eta_ci_low_min=random.uniform(5, 15),
                     eta_ci_high_min=random.uniform(15, 30),
                     service_min=nearest_stop.service_min,
                     load_cuft=nearest_stop.items_volume_cuft
                 ))
                 
-                current_location = nearest_stop.location
-                current_time += timedelta(minutes=nearest_stop.service_min)
+                current_min += nearest_stop.service_min
             
             # Return to depot
             if route_stops:
-                depot_distance = self.calculate_distance_km(current_location, truck_depot.location)
+                depot_distance = (
+                    float(cluster.depot_row[current_pos])
+                    if current_pos >= 0 else 0.0
+                )
                 depot_drive_time = depot_distance * 1.5
                 total_distance += depot_distance
                 total_drive_time += depot_drive_time
-                current_time += timedelta(minutes=depot_drive_time)
+                current_min += depot_drive_time
                 
                 route_stops.append(RouteStop(
                     stop_id=f"depot_end_{truck.id}",
                     type=StopType.DEPOT,
                     location=truck_depot.location,
-                    eta=current_time,
-                    service_min=0,
-                    load_cuft=0
+                    eta=window_start + timedelta(minutes=current_min),
+                    service_min=0.0,
+                    load_cuft=0.0
                 ))
                 
                 # Populate H3 cells
-                route_stops = self.populate_h3_cells(route_stops, request.params.overlap_h3_res)
+                route_stops = self.populate_h3_cells(route_stops, params.overlap_h3_res)
                 
                 # Calculate utilization
-                utilization = self.calculate_utilization(
-                    RouteSummary(truck_id=truck.id, stops=route_stops, distance_km=total_distance, 
-                               drive_time_min=total_drive_time, utilization_pct=0), 
-                    truck.capacity_cuft
-                )
+                utilization = self.calculate_utilization(route_stops, truck.capacity_cuft)
                 
                 routes.append(RouteSummary(
                     truck_id=truck.id,
@@ -278,12 +468,13 @@ class RoutingSimulator:
                     drive_time_min=total_drive_time,
                     utilization_pct=utilization
                 ))
+                route_deliveries.append([s for s in route_stops if s.type == StopType.DELIVERY])
         
         # Detect overlaps
         overlap_incidents = self.detect_overlaps(routes)
         
         # Calculate KPIs
-        total_stops = sum(len([s for s in route.stops if s.type == StopType.DELIVERY]) for route in routes)
+        total_stops = sum(len(deliveries) for deliveries in route_deliveries)
         on_time_stops = int(total_stops * random.uniform(0.85, 0.95))  # Simulate on-time performance
         
         kpi = PlanKPI(
@@ -297,17 +488,17 @@ class RoutingSimulator:
             routes=routes,
             overlap_incidents=overlap_incidents,
             kpi=kpi,
-            runtime_s=kpi.runtime_s
+            runtime_s=kpi.runtime_s,
+            delivery_stops=route_deliveries
         )
     
-    def _assign_stops_to_depots(self, stops: List, depots: List) -> Dict[str, List]:
-        """Assign stops to nearest depots"""
+    def _assign_stops_to_depots(self, depot_dist: np.ndarray, depots: List) -> Dict[str, List[int]]:
+        """Assign stops to nearest depots from an N x D distance matrix, returning stop indices per depot id"""
         assignments = {depot.id: [] for depot in depots}
+        nearest_depot = np.argmin(depot_dist, axis=1)
         
-        for stop in stops:
-            nearest_depot = min(depots, 
-                              key=lambda d: self.calculate_distance_km(stop.location, d.location))
-            assignments[nearest_depot.id].append(stop)
+        for col, depot in enumerate(depots):
+            assignments[depot.id].extend(np.flatnonzero(nearest_depot == col).tolist())
         
         return assignments
     
@@ -316,10 +507,15 @@ class RoutingSimulator:
         result = self.optimize_routes(request)
         
         # Generate pick/pack outputs
-        pickpack = [self.generate_pick_sequence(route) for route in result.routes]
+        pickpack = [
+            self.generate_pick_sequence(route, deliveries)
+            for route, deliveries in zip(result.routes, result.delivery_stops)
+        ]
         
         plan_id = str(uuid.uuid4())
         self._plan_cache[plan_id] = result
+        if len(self._plan_cache) > PLAN_CACHE_SIZE:
+            self._plan_cache.popitem(last=False)
         
         return PlanRunResponse(
             plan_id=plan_id,
@@ -333,27 +529,25 @@ class RoutingSimulator:
     def reroute(self, request: ReRouteRequest) -> ReRouteResponse:
         """Execute re-routing with change tracking"""
         # Get original plan
-        if request.plan_id not in self._plan_cache:
+        original_result = self._plan_cache.get(request.plan_id)
+        if original_result is None:
             raise ValueError(f"Plan {request.plan_id} not found")
-        
-        original_result = self._plan_cache[request.plan_id]
+        self._plan_cache.move_to_end(request.plan_id)
         
         # Simulate re-routing by modifying existing routes
         new_routes = []
         total_stops = 0
         changed_stops = 0
         
-        for route in original_result.routes:
+        for route, delivery_stops in zip(original_result.routes, original_result.delivery_stops):
+            total_stops += len(delivery_stops)
+            
             if request.scope == "truck" and route.truck_id != request.truck_id:
                 # Keep route unchanged if not in scope
                 new_routes.append(route)
-                delivery_stops = [s for s in route.stops if s.type == StopType.DELIVERY]
-                total_stops += len(delivery_stops)
                 continue
             
             # Apply limited changes based on change_limit
-            delivery_stops = [s for s in route.stops if s.type == StopType.DELIVERY]
-            total_stops += len(delivery_stops)
             
             max_changes = int(len(delivery_stops) * request.change_limit)
             actual_changes = random.randint(0, max_changes)
@@ -1,13 +1,34 @@
 """
 Test script for routing API endpoints
 """
-import requests
+import asyncio
+import httpx
 import json
 from datetime import datetime
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
 BASE_URL = "http://localhost:8003"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 
-def test_plan_run():
+def dump_json(payload) -> bytes:
+    """Serialize a request body up front (orjson when available)"""
+    return orjson.dumps(payload) if ORJSON_AVAILABLE else json.dumps(payload).encode()
+
+
+async def test_plan_run(client: httpx.AsyncClient):
     """Test the /routing/plan/run endpoint"""
     print("Testing POST /routing/plan/run...")
     
@@ -95,7 +116,7 @@ def test_plan_run():
     }
     
     try:
-        response = requests.post(f"{BASE_URL}/routing/plan/run", json=request_data)
+        response = await client.post("/routing/plan/run", content=dump_json(request_data), headers=JSON_HEADERS)
         print(f"Status: {response.status_code}")
         
         if response.status_code == 200:
@@ -132,18 +153,18 @@ def test_plan_run():
             print(f"❌ Error: {response.text}")
             return None
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ Request failed: {e}")
         return None
 
 
-def test_reroute(plan_id):
+async def test_reroute(client: httpx.AsyncClient, plan_id, out=print):
     """Test the /routing/reroute endpoint"""
     if not plan_id:
-        print("⏭️  Skipping reroute test - no plan_id available")
+        out("⏭️  Skipping reroute test - no plan_id available")
         return
         
-    print(f"\nTesting POST /routing/reroute with plan {plan_id}...")
+    out(f"\nTesting POST /routing/reroute with plan {plan_id}...")
     
     request_data = {
         "plan_id": plan_id,
@@ -157,32 +178,32 @@ def test_reroute(plan_id):
     }
     
     try:
-        response = requests.post(f"{BASE_URL}/routing/reroute", json=request_data)
-        print(f"Status: {response.status_code}")
+        response = await client.post("/routing/reroute", content=dump_json(request_data), headers=JSON_HEADERS)
+        out(f"Status: {response.status_code}")
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Re-routing completed for plan: {data['plan_id']}")
-            print(f"Changed stops: {data['changed_stops_pct']:.1%}")
-            print(f"Runtime: {data['runtime_s']:.2f}s")
-            print(f"Updated KPIs: on_time={data['kpi']['on_time_pct']:.1%}, overlap={data['kpi']['overlap_pct']:.1%}")
+            out(f"✅ Re-routing completed for plan: {data['plan_id']}")
+            out(f"Changed stops: {data['changed_stops_pct']:.1%}")
+            out(f"Runtime: {data['runtime_s']:.2f}s")
+            out(f"Updated KPIs: on_time={data['kpi']['on_time_pct']:.1%}, overlap={data['kpi']['overlap_pct']:.1%}")
             return True
         else:
-            print(f"❌ Error: {response.text}")
+            out(f"❌ Error: {response.text}")
             return False
             
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Request failed: {e}")
+    except httpx.HTTPError as e:
+        out(f"❌ Request failed: {e}")
         return False
 
 
-def test_truck_specific_reroute(plan_id):
+async def test_truck_specific_reroute(client: httpx.AsyncClient, plan_id, out=print):
     """Test truck-specific reroute"""
     if not plan_id:
-        print("⏭️  Skipping truck reroute test - no plan_id available")
+        out("⏭️  Skipping truck reroute test - no plan_id available")
         return
         
-    print(f"\nTesting POST /routing/reroute with truck scope...")
+    out(f"\nTesting POST /routing/reroute with truck scope...")
     
     request_data = {
         "plan_id": plan_id,
@@ -194,57 +215,114 @@ def test_truck_specific_reroute(plan_id):
     }
     
     try:
-        response = requests.post(f"{BASE_URL}/routing/reroute", json=request_data)
-        print(f"Status: {response.status_code}")
+        response = await client.post("/routing/reroute", content=dump_json(request_data), headers=JSON_HEADERS)
+        out(f"Status: {response.status_code}")
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Truck-specific re-routing completed")
-            print(f"Changed stops: {data['changed_stops_pct']:.1%}")
-            print(f"Runtime: {data['runtime_s']:.2f}s")
+            out(f"✅ Truck-specific re-routing completed")
+            out(f"Changed stops: {data['changed_stops_pct']:.1%}")
+            out(f"Runtime: {data['runtime_s']:.2f}s")
             return True
         else:
-            print(f"❌ Error: {response.text}")
+            out(f"❌ Error: {response.text}")
             return False
             
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Request failed: {e}")
+    except httpx.HTTPError as e:
+        out(f"❌ Request failed: {e}")
         return False
 
 
-def test_health():
+async def test_plan_run_msgpack(client: httpx.AsyncClient):
+    """Test the /routing/plan/run endpoint with a msgpack response"""
+    if not MSGSPEC_AVAILABLE:
+        print("\n⏭️  Skipping msgpack plan test - msgspec not installed")
+        return False
+    
+    print("\nTesting POST /routing/plan/run with Accept: application/x-msgpack...")
+    
+    request_data = {
+        "for_date": "2024-12-15",
+        "depots": [{"id": "depot_north", "location": {"lat": 43.761539, "lon": -79.411079}}],
+        "trucks": [{"id": "truck_001", "depot_id": "depot_north", "capacity_cuft": 1000}],
+        "stops": [
+            {
+                "order_id": "ORD001",
+                "franchisee_id": "FRAN001",
+                "location": {"lat": 43.7165, "lon": -79.3404},
+                "items_volume_cuft": 150,
+                "service_min": 20
+            }
+        ]
+    }
+    
+    try:
+        response = await client.post(
+            "/routing/plan/run",
+            content=dump_json(request_data),
+            headers={**JSON_HEADERS, "Accept": MSGPACK_MEDIA_TYPE}
+        )
+        content_type = response.headers.get("content-type", "")
+        print(f"Status: {response.status_code}, Content-Type: {content_type}")
+        
+        if response.status_code == 200 and content_type.startswith(MSGPACK_MEDIA_TYPE):
+            data = msgspec.msgpack.decode(response.content)
+            print(f"✅ Msgpack plan decoded: {data['plan_id']} with {len(data['routes'])} routes")
+            return True
+        else:
+            print(f"❌ Expected a {MSGPACK_MEDIA_TYPE} response: {response.text[:200]}")
+            return False
+            
+    except (httpx.HTTPError, msgspec.DecodeError) as e:
+        print(f"❌ Msgpack plan test failed: {e}")
+        return False
+
+
+async def test_health(client: httpx.AsyncClient):
     """Test health endpoints"""
     print("\nTesting health endpoints...")
     
     try:
         # Test main health
-        response = requests.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             print("✅ Main health check passed")
         
         # Test routing health
-        response = requests.get(f"{BASE_URL}/routing/health")
+        response = await client.get("/routing/health")
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Routing health check passed - H3 available: {data.get('h3_available', False)}")
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ Health check failed: {e}")
 
 
-if __name__ == "__main__":
+async def main():
     print("🚛 Testing Routing API Endpoints")
     print("=" * 50)
     
-    # Test health first
-    test_health()
-    
-    # Test plan run
-    plan_id = test_plan_run()
-    
-    # Test rerouting
-    test_reroute(plan_id)
-    test_truck_specific_reroute(plan_id)
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        # Test health first
+        await test_health(client)
+        
+        # Test plan run
+        plan_id = await test_plan_run(client)
+        await test_plan_run_msgpack(client)
+        
+        # Both reroutes only depend on the plan, so run them concurrently and
+        # print each check's buffered output afterwards to keep it readable
+        reroute_log, truck_reroute_log = [], []
+        await asyncio.gather(
+            test_reroute(client, plan_id, out=reroute_log.append),
+            test_truck_specific_reroute(client, plan_id, out=truck_reroute_log.append)
+        )
+        for line in reroute_log + truck_reroute_log:
+            print(line)
     
     print("\n" + "=" * 50)
-    print("✨ Testing completed!")
\ No newline at end of file
+    print("✨ Testing completed!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file